@@ -67,6 +67,17 @@ DBUS_INTERFACE_XML = """
 </node>
 """
 
+# Parsed once per process; the interface XML is constant
+DBUS_NODE_INFO = Gio.DBusNodeInfo.new_for_xml(DBUS_INTERFACE_XML)
+DBUS_INTERFACE_INFO = DBUS_NODE_INFO.lookup_interface('org.zoned.TestWindow')
+
+# Constant replies (GVariants are immutable, so they can be reused)
+PONG_REPLY = GLib.Variant('(s)', ('pong',))
+SUCCESS_REPLY = GLib.Variant('(b)', (True,))
+
+# JSON literal for a Python bool
+JSON_BOOL = {True: 'true', False: 'false'}
+
 class TestWindow(Gtk.ApplicationWindow):
     """A simple test window with D-Bus state reporting."""
     
@@ -104,7 +115,7 @@ class TestWindow(Gtk.ApplicationWindow):
         # We'll use the surface's device position when available
     
     def get_geometry(self):
-        """Get current window geometry."""
+        """Get current window geometry as (x, y, width, height)."""
         # In GTK4, getting the exact position is compositor-dependent
         # For X11, we can try to get it from the native surface
         x, y = 0, 0
@@ -126,22 +137,17 @@ class TestWindow(Gtk.ApplicationWindow):
             except Exception:
                 pass
         
-        return {
-            'x': x,
-            'y': y,
-            'width': width,
-            'height': height,
-        }
+        return x, y, width, height
     
     def get_state(self):
-        """Get current window state."""
-        return {
-            'title': self.get_title(),
-            'visible': self.get_visible(),
-            'maximized': self.is_maximized(),
-            'fullscreen': self.is_fullscreen(),
-            'focused': self.is_active(),
-        }
+        """Get current window state as (title, visible, maximized, fullscreen, focused)."""
+        return (
+            self.get_title(),
+            self.get_visible(),
+            self.is_maximized(),
+            self.is_fullscreen(),
+            self.is_active(),
+        )
     
     def focus_window(self):
         """Attempt to focus this window."""
@@ -157,6 +163,15 @@ class DBusService:
         self._bus_id = None
         self._registration_id = None
         
+        # Method name -> handler(invocation)
+        self._handlers = {
+            'GetGeometry': self._handle_get_geometry,
+            'GetState': self._handle_get_state,
+            'Focus': self._handle_focus,
+            'Close': self._handle_close,
+            'Ping': self._handle_ping,
+        }
+        
         # Register D-Bus service
         self._bus_id = Gio.bus_own_name(
             Gio.BusType.SESSION,
@@ -169,12 +184,9 @@ class DBusService:
     
     def _on_bus_acquired(self, connection, name):
         """Called when D-Bus connection is acquired."""
-        node_info = Gio.DBusNodeInfo.new_for_xml(DBUS_INTERFACE_XML)
-        interface_info = node_info.lookup_interface('org.zoned.TestWindow')
-        
         self._registration_id = connection.register_object(
             '/org/zoned/TestWindow',
-            interface_info,
+            DBUS_INTERFACE_INFO,
             self._on_method_call,
             None,
             None,
@@ -191,38 +203,17 @@ class DBusService:
     def _on_method_call(self, connection, sender, object_path, interface_name,
                         method_name, parameters, invocation):
         """Handle D-Bus method calls."""
+        handler = self._handlers.get(method_name)
+        if handler is None:
+            invocation.return_error_literal(
+                Gio.dbus_error_quark(),
+                Gio.DBusError.UNKNOWN_METHOD,
+                f'Unknown method: {method_name}'
+            )
+            return
+        
         try:
-            if method_name == 'GetGeometry':
-                geometry = self._window.get_geometry()
-                result = GLib.Variant('(s)', (json.dumps(geometry),))
-                invocation.return_value(result)
-            
-            elif method_name == 'GetState':
-                state = self._window.get_state()
-                result = GLib.Variant('(s)', (json.dumps(state),))
-                invocation.return_value(result)
-            
-            elif method_name == 'Focus':
-                success = self._window.focus_window()
-                result = GLib.Variant('(b)', (success,))
-                invocation.return_value(result)
-            
-            elif method_name == 'Close':
-                # Schedule close on main loop
-                GLib.idle_add(self._window.close)
-                result = GLib.Variant('(b)', (True,))
-                invocation.return_value(result)
-            
-            elif method_name == 'Ping':
-                result = GLib.Variant('(s)', ('pong',))
-                invocation.return_value(result)
-            
-            else:
-                invocation.return_error_literal(
-                    Gio.dbus_error_quark(),
-                    Gio.DBusError.UNKNOWN_METHOD,
-                    f'Unknown method: {method_name}'
-                )
+            handler(invocation)
         except Exception as e:
             invocation.return_error_literal(
                 Gio.dbus_error_quark(),
@@ -230,6 +221,39 @@ class DBusService:
                 str(e)
             )
     
+    def _handle_get_geometry(self, invocation):
+        """Return window geometry as a JSON string."""
+        # Fixed schema of four ints, so format directly instead of json.dumps
+        x, y, width, height = self._window.get_geometry()
+        geometry = f'{{"x": {x}, "y": {y}, "width": {width}, "height": {height}}}'
+        invocation.return_value(GLib.Variant('(s)', (geometry,)))
+    
+    def _handle_get_state(self, invocation):
+        """Return window state as a JSON string."""
+        # Only the title needs JSON escaping; the rest are booleans
+        title, visible, maximized, fullscreen, focused = self._window.get_state()
+        state = (
+            f'{{"title": {json.dumps(title)}, "visible": {JSON_BOOL[visible]}, '
+            f'"maximized": {JSON_BOOL[maximized]}, "fullscreen": {JSON_BOOL[fullscreen]}, '
+            f'"focused": {JSON_BOOL[focused]}}}'
+        )
+        invocation.return_value(GLib.Variant('(s)', (state,)))
+    
+    def _handle_focus(self, invocation):
+        """Focus the window."""
+        success = self._window.focus_window()
+        invocation.return_value(GLib.Variant('(b)', (success,)))
+    
+    def _handle_close(self, invocation):
+        """Close the window."""
+        # Schedule close on main loop
+        GLib.idle_add(self._window.close)
+        invocation.return_value(SUCCESS_REPLY)
+    
+    def _handle_ping(self, invocation):
+        """Reply to a liveness check."""
+        invocation.return_value(PONG_REPLY)
+    
     def cleanup(self):
         """Clean up D-Bus registration."""
         if self._bus_id:
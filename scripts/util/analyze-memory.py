@@ -9,24 +9,53 @@ Usage:
     python analyze-memory.py results/memory-*.csv
     python analyze-memory.py results/memory-*.csv --longhaul results/longhaul-*.csv
     python analyze-memory.py results/memory-*.csv --output report.html
+    python analyze-memory.py results/memory-*.csv --chunksize 100000
+    python analyze-memory.py results/memory-*.csv --gzip
 
 Requirements:
     pip install plotly pandas
+    pip install pyarrow  (optional, faster CSV parsing)
+    pip install polars pyarrow  (optional, faster per-test statistics)
 """
 
 import argparse
+import gzip
 import sys
 from pathlib import Path
 from datetime import datetime
 
-try:
-    import pandas as pd
-    import plotly.graph_objects as go
-    from plotly.subplots import make_subplots
-except ImportError:
-    print("Error: Required packages not installed")
-    print("Install with: pip install plotly pandas")
-    sys.exit(1)
+# Heavy dependencies are imported by load_dependencies() once arguments have
+# been validated, so --help and bad paths fail fast
+np = pd = pl = go = make_subplots = get_plotlyjs_version = None
+CSV_ENGINE = 'c'
+
+
+def load_dependencies():
+    """Import pandas/plotly (and optionally pyarrow/polars) into module globals."""
+    global np, pd, pl, go, make_subplots, get_plotlyjs_version, CSV_ENGINE
+    
+    try:
+        import numpy as np
+        import pandas as pd
+        import plotly.graph_objects as go
+        from plotly.offline import get_plotlyjs_version
+        from plotly.subplots import make_subplots
+    except ImportError:
+        print("Error: Required packages not installed")
+        print("Install with: pip install plotly pandas")
+        sys.exit(1)
+    
+    try:
+        import pyarrow  # Enables pandas' multi-threaded CSV parser
+        CSV_ENGINE = 'pyarrow'
+    except ImportError:
+        CSV_ENGINE = 'c'
+    
+    try:
+        import polars as pl  # Faster per-test aggregation on long runs
+        import pyarrow  # Needed to hand frames between pandas and polars
+    except ImportError:
+        pl = None
 
 
 # Test name to color mapping for consistency
@@ -44,30 +73,216 @@ TEST_COLORS = {
     'unknown': '#bdc3c7',
 }
 
+# Column types of memory-*.csv (see scripts/tests/memory-monitor.sh), so
+# read_csv can skip type inference. Nullable ints tolerate the occasional
+# empty field when a sample could not be collected; test_name has a few
+# distinct values repeated for every sample, so it is stored as a category.
+MEMORY_DTYPES = {
+    'timestamp': 'int64',
+    'test_name': 'category',
+    'shell_rss_kb': 'Int32',
+    'gjs_rss_kb': 'Int32',
+    'gjs_vm_kb': 'Int32',
+    'gjs_shared_kb': 'Int32',
+    'gjs_data_kb': 'Int32',
+    'active_signals': 'Int32',
+    'active_timers': 'Int32',
+    'active_actors': 'Int32',
+    'leaked_signals': 'Int32',
+    'leaked_timers': 'Int32',
+}
+
+# Summary table row for a single test
+SUMMARY_ROW_TEMPLATE = """
+            <tr>
+                <td style="border: 1px solid #ddd; padding: 8px;">{test_name}</td>
+                <td style="border: 1px solid #ddd; padding: 8px; color: {color};">{delta_mb:.1f} MB</td>
+                <td style="border: 1px solid #ddd; padding: 8px;">{leaked_signals}</td>
+                <td style="border: 1px solid #ddd; padding: 8px;">{leaked_timers}</td>
+            </tr>
+        """
+
+# Figure layouts, applied once when each figure is created (axis names follow
+# make_subplots numbering: row 1 -> xaxis/yaxis, row 2 -> xaxis2/yaxis2, ...)
+TIMELINE_LAYOUT = {
+    'height': 900,
+    'hovermode': 'x unified',
+    'showlegend': True,
+    'legend': {'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1},
+    'xaxis3': {'title': {'text': 'Time (minutes)'}},
+    'yaxis': {'title': {'text': 'Memory (MB)'}},
+    'yaxis2': {'title': {'text': 'Memory (MB)'}},
+    'yaxis3': {'title': {'text': 'Count'}},
+}
+
+PER_TEST_LAYOUT = {
+    'height': 500,
+    'showlegend': True,
+    'xaxis': {'tickangle': -45},
+    'xaxis2': {'tickangle': -45},
+    'yaxis': {'title': {'text': 'Memory Growth (MB)'}},
+    'yaxis2': {'title': {'text': 'Leak Count'}},
+}
+
+# Row count above which per-test statistics are aggregated with polars (when
+# installed); below this the pandas/polars conversion costs more than it saves
+POLARS_MIN_ROWS = 100_000
+
+# Maximum points per timeline trace; longer traces are downsampled with LTTB
+MAX_TRACE_POINTS = 3000
+
+# Columns a chunked load reads and keeps: the timeline's series plus what the
+# per-test statistics and summary need
+PLOT_COLUMNS = ['timestamp', 'test_name', 'shell_rss_kb', 'gjs_rss_kb', 'gjs_shared_kb',
+                'leaked_signals', 'leaked_timers']
+
+# Rows a chunked load may hold for plotting before thinning them again. Each
+# thinning leaves at most 4 * MAX_TRACE_POINTS rows (one LTTB selection per
+# plotted series) plus test phase starts, so this leaves room between passes.
+MAX_KEPT_ROWS = 8 * MAX_TRACE_POINTS
+
 
 def load_memory_csv(filepath):
     """Load memory CSV file with proper column names."""
-    df = pd.read_csv(filepath)
+    df = pd.read_csv(filepath, engine=CSV_ENGINE, dtype=MEMORY_DTYPES)
     
     # Convert timestamp to datetime for better plotting
     df['datetime'] = pd.to_datetime(df['timestamp'], unit='s')
     
-    # Calculate elapsed time in minutes
-    df['elapsed_min'] = (df['timestamp'] - df['timestamp'].min()) / 60
+    # Calculate elapsed time in minutes (samples are appended in order, so
+    # the first timestamp is the start of the run)
+    ts = df['timestamp'].to_numpy()
+    df['elapsed_min'] = (ts - ts[0]) * (1 / 60) if len(ts) else ts
     
     return df
 
 
+def load_memory_csv_chunked(filepath, chunksize):
+    """
+    Load a large memory CSV chunk by chunk, keeping a bounded plotting sample.
+
+    Per-test statistics are accumulated over every sample, but only the
+    plotted columns of the rows needed for plotting (LTTB-selected points and
+    test phase starts) are kept. Whenever more than MAX_KEPT_ROWS have been
+    kept, they are thinned again the same way, so memory use depends on
+    chunksize and MAX_TRACE_POINTS rather than on the length of the file.
+    Returns (downsampled_df, test_stats).
+    """
+    kept = []
+    n_kept = 0
+    partial_stats = []
+    t0 = None
+    
+    for chunk in pd.read_csv(filepath, chunksize=chunksize, dtype=MEMORY_DTYPES,
+                             usecols=PLOT_COLUMNS):
+        if t0 is None:
+            t0 = chunk['timestamp'].iat[0]
+        
+        ts = chunk['timestamp'].to_numpy()
+        chunk['elapsed_min'] = (ts - t0) * (1 / 60)
+        
+        partial_stats.append(aggregate_test_stats(chunk))
+        
+        chunk = chunk.iloc[plot_rows(chunk)]
+        kept.append(chunk)
+        n_kept += len(chunk)
+        
+        if n_kept > MAX_KEPT_ROWS:
+            df = pd.concat(kept, ignore_index=True)
+            kept = [df.iloc[plot_rows(df)]]
+            n_kept = len(kept[0])
+    
+    df = pd.concat(kept, ignore_index=True)
+    df['datetime'] = pd.to_datetime(df['timestamp'], unit='s')
+    df['test_name'] = df['test_name'].astype('category')
+    
+    return df, finalize_test_stats(merge_test_stats(partial_stats))
+
+
+def plot_rows(df):
+    """
+    Indices of the rows of df needed to draw its timeline.
+
+    These are the first sample of every test phase plus the LTTB selection of
+    each plotted series. LTTB always keeps a frame's first and last rows, so a
+    phase starting on a chunk boundary is kept too.
+    """
+    codes, _ = pd.factorize(df['test_name'], use_na_sentinel=False)
+    starts = np.flatnonzero(np.diff(codes)) + 1
+    
+    elapsed = df['elapsed_min'].to_numpy()
+    return np.unique(np.concatenate([
+        starts,
+        lttb_indices(elapsed, float_column(df, 'shell_rss_kb')),
+        lttb_indices(elapsed, float_column(df, 'gjs_rss_kb') + float_column(df, 'gjs_shared_kb')),
+        lttb_indices(elapsed, float_column(df, 'leaked_signals')),
+        lttb_indices(elapsed, float_column(df, 'leaked_timers')),
+    ]))
+
+
+def float_column(df, column):
+    """
+    Return a column as a float64 ndarray with missing samples as NaN.
+
+    Before pandas 2.2, to_numpy() on a nullable Int32 column returns an
+    object array holding pd.NA, which numpy arithmetic cannot handle.
+    """
+    return df[column].to_numpy('float64', na_value=np.nan)
+
+
 def load_longhaul_csv(filepath):
     """Load longhaul CSV file."""
-    df = pd.read_csv(filepath)
+    df = pd.read_csv(filepath, engine=CSV_ENGINE)
     df['datetime'] = pd.to_datetime(df['timestamp'], unit='s')
     return df
 
 
+def lttb_indices(x, y, n_out=MAX_TRACE_POINTS):
+    """
+    Select indices of the points to keep using Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last samples and, for each bucket in between, the
+    sample forming the largest triangle with the previously kept point and
+    the average of the next bucket. Preserves peaks and visual shape.
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    
+    # Bucket boundaries for the n_out - 2 interior buckets, plus a final
+    # "bucket" holding only the last point
+    every = (n - 2) / (n_out - 2)
+    edges = np.floor(np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges = np.append(edges, n)
+    
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2]
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(areas.argmax())
+        indices[i + 1] = a
+    
+    return indices
+
+
 def create_memory_timeline(df, title="Memory Over Time"):
     """Create interactive timeline of memory usage."""
     fig = make_subplots(
+        figure=go.Figure(layout=dict(TIMELINE_LAYOUT, title=title)),
         rows=3, cols=1,
         shared_xaxes=True,
         vertical_spacing=0.05,
@@ -79,15 +294,25 @@ def create_memory_timeline(df, title="Memory Over Time"):
         row_heights=[0.4, 0.4, 0.2]
     )
     
+    # Convert each column to an ndarray once (memory scaled to MB) and
+    # reuse it across downsampling and trace construction
+    elapsed = df['elapsed_min'].to_numpy()
+    shell_mb = float_column(df, 'shell_rss_kb') * (1 / 1024)
+    gjs_rss_mb = float_column(df, 'gjs_rss_kb') * (1 / 1024)
+    gjs_shared_mb = float_column(df, 'gjs_shared_kb') * (1 / 1024)
+    leaked_signals = float_column(df, 'leaked_signals')
+    leaked_timers = float_column(df, 'leaked_timers')
+    
     # Row 1: Shell RSS memory with test phases highlighted
+    keep = lttb_indices(elapsed, shell_mb)
     fig.add_trace(
-        go.Scatter(
-            x=df['elapsed_min'],
-            y=df['shell_rss_kb'] / 1024,  # Convert to MB
+        go.Scattergl(
+            x=elapsed[keep],
+            y=shell_mb[keep],
             name='Shell RSS',
             line=dict(color='#2c3e50', width=2),
             hovertemplate='<b>Shell RSS</b><br>Time: %{x:.1f}m<br>Memory: %{y:.1f}MB<br>Test: %{text}<extra></extra>',
-            text=df['test_name']
+            text=df['test_name'].to_numpy()[keep]
         ),
         row=1, col=1
     )
@@ -95,11 +320,13 @@ def create_memory_timeline(df, title="Memory Over Time"):
     # Add background colors for test phases
     add_test_phase_backgrounds(fig, df, row=1)
     
-    # Row 2: GJS memory components
+    # Row 2: GJS memory components (stacked traces must share x values,
+    # so downsample on their sum; Scattergl has no stackgroup support)
+    keep = lttb_indices(elapsed, gjs_rss_mb + gjs_shared_mb)
     fig.add_trace(
         go.Scatter(
-            x=df['elapsed_min'],
-            y=df['gjs_rss_kb'] / 1024,
+            x=elapsed[keep],
+            y=gjs_rss_mb[keep],
             name='GJS RSS',
             line=dict(color='#3498db'),
             stackgroup='gjs'
@@ -109,8 +336,8 @@ def create_memory_timeline(df, title="Memory Over Time"):
     
     fig.add_trace(
         go.Scatter(
-            x=df['elapsed_min'],
-            y=df['gjs_shared_kb'] / 1024,
+            x=elapsed[keep],
+            y=gjs_shared_mb[keep],
             name='GJS Shared',
             line=dict(color='#2ecc71'),
             stackgroup='gjs'
@@ -119,10 +346,11 @@ def create_memory_timeline(df, title="Memory Over Time"):
     )
     
     # Row 3: Resource tracker leaks
+    keep = lttb_indices(elapsed, leaked_signals)
     fig.add_trace(
-        go.Scatter(
-            x=df['elapsed_min'],
-            y=df['leaked_signals'],
+        go.Scattergl(
+            x=elapsed[keep],
+            y=leaked_signals[keep],
             name='Leaked Signals',
             line=dict(color='#e74c3c', width=2),
             mode='lines+markers'
@@ -130,10 +358,11 @@ def create_memory_timeline(df, title="Memory Over Time"):
         row=3, col=1
     )
     
+    keep = lttb_indices(elapsed, leaked_timers)
     fig.add_trace(
-        go.Scatter(
-            x=df['elapsed_min'],
-            y=df['leaked_timers'],
+        go.Scattergl(
+            x=elapsed[keep],
+            y=leaked_timers[keep],
             name='Leaked Timers',
             line=dict(color='#f39c12', width=2),
             mode='lines+markers'
@@ -141,55 +370,30 @@ def create_memory_timeline(df, title="Memory Over Time"):
         row=3, col=1
     )
     
-    # Update layout
-    fig.update_xaxes(title_text="Time (minutes)", row=3, col=1)
-    fig.update_yaxes(title_text="Memory (MB)", row=1, col=1)
-    fig.update_yaxes(title_text="Memory (MB)", row=2, col=1)
-    fig.update_yaxes(title_text="Count", row=3, col=1)
-    
-    fig.update_layout(
-        title=title,
-        height=900,
-        hovermode='x unified',
-        showlegend=True,
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-    )
-    
     return fig
 
 
 def add_test_phase_backgrounds(fig, df, row):
     """Add colored background rectangles for each test phase."""
-    current_test = None
-    start_time = None
+    if df.empty:
+        return
     
-    for i, row_data in df.iterrows():
-        test = row_data['test_name']
-        time = row_data['elapsed_min']
-        
-        if test != current_test:
-            # End previous phase
-            if current_test is not None:
-                fig.add_vrect(
-                    x0=start_time,
-                    x1=time,
-                    fillcolor=TEST_COLORS.get(current_test, '#ecf0f1'),
-                    opacity=0.2,
-                    layer="below",
-                    line_width=0,
-                    row=row, col=1
-                )
-            
-            # Start new phase
-            current_test = test
-            start_time = time
-    
-    # Add final phase
-    if current_test is not None:
+    # Find phase boundaries on integer codes: a phase starts at the first
+    # sample and wherever the code differs from the previous sample
+    codes, uniques = pd.factorize(df['test_name'], use_na_sentinel=False)
+    idx = np.flatnonzero(np.diff(codes)) + 1
+    idx = np.insert(idx, 0, 0)
+    elapsed = df['elapsed_min'].to_numpy()
+    
+    starts = elapsed[idx]
+    ends = np.append(starts[1:], elapsed[-1])
+    names = np.asarray(uniques)[codes[idx]]
+    
+    for test, x0, x1 in zip(names, starts, ends):
         fig.add_vrect(
-            x0=start_time,
-            x1=df['elapsed_min'].max(),
-            fillcolor=TEST_COLORS.get(current_test, '#ecf0f1'),
+            x0=x0,
+            x1=x1,
+            fillcolor=TEST_COLORS.get(test, '#ecf0f1'),
             opacity=0.2,
             layer="below",
             line_width=0,
@@ -197,38 +401,101 @@ def add_test_phase_backgrounds(fig, df, row):
         )
 
 
-def create_per_test_analysis(df):
-    """Create bar chart showing memory growth per test."""
-    # Group by test and calculate statistics
-    test_stats = df.groupby('test_name').agg({
-        'shell_rss_kb': ['min', 'max', 'mean'],
-        'leaked_signals': 'max',
-        'leaked_timers': 'max'
-    }).reset_index()
-    
-    # Flatten column names
-    test_stats.columns = ['test_name', 'min_rss', 'max_rss', 'avg_rss', 'max_leaked_signals', 'max_leaked_timers']
+def aggregate_test_stats(df):
+    """Compute per-test partial statistics that can be merged across chunks."""
+    if pl is not None and len(df) > POLARS_MIN_ROWS:
+        columns = ['test_name', 'shell_rss_kb', 'leaked_signals', 'leaked_timers']
+        return pl.from_pandas(df[columns]).group_by('test_name').agg(
+            pl.col('shell_rss_kb').min().alias('min_rss'),
+            pl.col('shell_rss_kb').max().alias('max_rss'),
+            pl.col('shell_rss_kb').cast(pl.Int64).sum().alias('sum_rss'),
+            pl.col('shell_rss_kb').count().alias('rss_count'),
+            pl.len().alias('samples'),
+            pl.col('leaked_signals').max().alias('max_leaked_signals'),
+            pl.col('leaked_timers').max().alias('max_leaked_timers'),
+        ).to_pandas().set_index('test_name')
+    
+    # Unsorted: finalize_test_stats does the ordering. Unnamed samples are
+    # kept so run-wide totals still count them.
+    return df.groupby('test_name', sort=False, observed=True, dropna=False).agg(
+        min_rss=('shell_rss_kb', 'min'),
+        max_rss=('shell_rss_kb', 'max'),
+        sum_rss=('shell_rss_kb', 'sum'),
+        rss_count=('shell_rss_kb', 'count'),
+        samples=('shell_rss_kb', 'size'),
+        max_leaked_signals=('leaked_signals', 'max'),
+        max_leaked_timers=('leaked_timers', 'max'),
+    )
+
+
+def merge_test_stats(partials):
+    """Combine partial statistics from aggregate_test_stats()."""
+    return pd.concat(partials).groupby(level=0, sort=False, dropna=False).agg({
+        'min_rss': 'min',
+        'max_rss': 'max',
+        'sum_rss': 'sum',
+        'rss_count': 'sum',
+        'samples': 'sum',
+        'max_leaked_signals': 'max',
+        'max_leaked_timers': 'max',
+    })
+
+
+def finalize_test_stats(stats):
+    """
+    Derive averages and memory deltas, sorted by largest growth first.
+
+    Tests with equal growth are listed by name. Samples without a test name
+    keep a row (test_name NaN) so run-wide totals include them; use
+    named_tests() for anything listed per test.
+    """
+    test_stats = stats.reset_index()
+    # Average over collected readings only; 'samples' also counts rows with
+    # an empty shell_rss_kb field
+    test_stats['avg_rss'] = test_stats['sum_rss'] / test_stats['rss_count']
     
     # Calculate memory delta
-    test_stats['delta_mb'] = (test_stats['max_rss'] - test_stats['min_rss']) / 1024
+    test_stats['delta_mb'] = (test_stats['max_rss'] - test_stats['min_rss']) * (1 / 1024)
     
-    # Sort by delta
-    test_stats = test_stats.sort_values('delta_mb', ascending=False)
+    # Sort by name first so the stable delta sort breaks ties alphabetically
+    test_stats = test_stats.sort_values('test_name', key=lambda names: names.astype(object))
+    return test_stats.sort_values('delta_mb', ascending=False, kind='stable')
+
+
+def named_tests(test_stats):
+    """Rows of finalize_test_stats() output that belong to a named test."""
+    return test_stats[test_stats['test_name'].notna()]
+
+
+def create_per_test_analysis(df, test_stats=None):
+    """
+    Create bar chart showing memory growth per test.
+
+    test_stats may be passed in when it was accumulated while loading
+    (see load_memory_csv_chunked); otherwise it is computed from df.
+    """
+    if test_stats is None:
+        test_stats = finalize_test_stats(aggregate_test_stats(df))
     
     # Create subplot with 2 charts
     fig = make_subplots(
+        figure=go.Figure(layout=PER_TEST_LAYOUT),
         rows=1, cols=2,
         subplot_titles=('Memory Growth Per Test', 'Resource Leaks Per Test'),
         specs=[[{"type": "bar"}, {"type": "bar"}]]
     )
     
+    tests = named_tests(test_stats)
+    
     # Memory growth chart
-    colors = [TEST_COLORS.get(test, '#95a5a6') for test in test_stats['test_name']]
+    # Look up colors on object dtype so fillna isn't limited to the
+    # categorical's existing values
+    colors = tests['test_name'].astype(object).map(TEST_COLORS).fillna('#95a5a6').to_numpy()
     
     fig.add_trace(
         go.Bar(
-            x=test_stats['test_name'],
-            y=test_stats['delta_mb'],
+            x=tests['test_name'],
+            y=tests['delta_mb'],
             name='Memory Delta',
             marker_color=colors,
             hovertemplate='<b>%{x}</b><br>Growth: %{y:.1f}MB<extra></extra>'
@@ -239,8 +506,8 @@ def create_per_test_analysis(df):
     # Resource leaks chart
     fig.add_trace(
         go.Bar(
-            x=test_stats['test_name'],
-            y=test_stats['max_leaked_signals'],
+            x=tests['test_name'],
+            y=tests['max_leaked_signals'],
             name='Leaked Signals',
             marker_color='#e74c3c'
         ),
@@ -249,33 +516,33 @@ def create_per_test_analysis(df):
     
     fig.add_trace(
         go.Bar(
-            x=test_stats['test_name'],
-            y=test_stats['max_leaked_timers'],
+            x=tests['test_name'],
+            y=tests['max_leaked_timers'],
             name='Leaked Timers',
             marker_color='#f39c12'
         ),
         row=1, col=2
     )
     
-    fig.update_xaxes(tickangle=-45, row=1, col=1)
-    fig.update_xaxes(tickangle=-45, row=1, col=2)
-    fig.update_yaxes(title_text="Memory Growth (MB)", row=1, col=1)
-    fig.update_yaxes(title_text="Leak Count", row=1, col=2)
-    
-    fig.update_layout(height=500, showlegend=True)
-    
     return fig, test_stats
 
 
 def create_summary_table(df, test_stats):
     """Create summary statistics table."""
-    # Calculate overall statistics
-    total_time = (df['timestamp'].max() - df['timestamp'].min()) / 60  # minutes
-    total_growth = (df['shell_rss_kb'].iloc[-1] - df['shell_rss_kb'].iloc[0]) / 1024  # MB
-    max_leaked_signals = df['leaked_signals'].max()
-    max_leaked_timers = df['leaked_timers'].max()
-    
-    summary_html = f"""
+    # Calculate overall statistics (samples are in chronological order, so
+    # the first and last rows bound the run)
+    ts = df['timestamp'].to_numpy()
+    rss = float_column(df, 'shell_rss_kb')
+    total_time = (ts[-1] - ts[0]) / 60  # minutes
+    total_growth = (rss[-1] - rss[0]) / 1024  # MB
+    
+    # Leak maxima and sample count come from test_stats, which covers every
+    # sample even when df has been downsampled by a chunked load
+    max_leaked_signals = test_stats['max_leaked_signals'].max()
+    max_leaked_timers = test_stats['max_leaked_timers'].max()
+    samples = test_stats['samples'].sum()
+    
+    parts = [f"""
     <div style="font-family: Arial, sans-serif; padding: 20px;">
         <h2>Memory Analysis Summary</h2>
         <table style="border-collapse: collapse; width: 100%;">
@@ -307,7 +574,7 @@ def create_summary_table(df, test_stats):
             </tr>
             <tr>
                 <td style="border: 1px solid #ddd; padding: 8px;">Samples Collected</td>
-                <td style="border: 1px solid #ddd; padding: 8px;">{len(df)}</td>
+                <td style="border: 1px solid #ddd; padding: 8px;">{samples}</td>
             </tr>
         </table>
         
@@ -319,40 +586,46 @@ def create_summary_table(df, test_stats):
                 <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Leaked Signals</th>
                 <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Leaked Timers</th>
             </tr>
-    """
-    
-    for _, row in test_stats.head(5).iterrows():
-        color = 'red' if row['delta_mb'] > 10 else 'orange' if row['delta_mb'] > 5 else 'green'
-        summary_html += f"""
-            <tr>
-                <td style="border: 1px solid #ddd; padding: 8px;">{row['test_name']}</td>
-                <td style="border: 1px solid #ddd; padding: 8px; color: {color};">{row['delta_mb']:.1f} MB</td>
-                <td style="border: 1px solid #ddd; padding: 8px;">{int(row['max_leaked_signals'])}</td>
-                <td style="border: 1px solid #ddd; padding: 8px;">{int(row['max_leaked_timers'])}</td>
-            </tr>
-        """
-    
-    summary_html += """
+    """]
+    
+    for row in named_tests(test_stats).head(5).itertuples(index=False):
+        color = 'red' if row.delta_mb > 10 else 'orange' if row.delta_mb > 5 else 'green'
+        parts.append(SUMMARY_ROW_TEMPLATE.format(
+            test_name=row.test_name,
+            color=color,
+            delta_mb=row.delta_mb,
+            leaked_signals=int(row.max_leaked_signals),
+            leaked_timers=int(row.max_leaked_timers),
+        ))
+    
+    parts.append("""
         </table>
     </div>
-    """
+    """)
     
-    return summary_html
+    return ''.join(parts)
 
 
-def generate_report(memory_file, longhaul_file=None, output_file=None):
+def generate_report(memory_file, longhaul_file=None, output_file=None, chunksize=None, compress=False):
     """Generate HTML report with interactive visualizations."""
-    print(f"Loading memory data from: {memory_file}")
-    df = load_memory_csv(memory_file)
+    load_dependencies()
     
-    print(f"Loaded {len(df)} samples spanning {df['elapsed_min'].max():.1f} minutes")
+    print(f"Loading memory data from: {memory_file}")
+    if chunksize is not None:
+        df, test_stats = load_memory_csv_chunked(memory_file, chunksize)
+        print(f"Loaded {test_stats['samples'].sum()} samples spanning {df['elapsed_min'].max():.1f} minutes "
+              f"({len(df)} kept for plotting)")
+    else:
+        df = load_memory_csv(memory_file)
+        test_stats = None
+        print(f"Loaded {len(df)} samples spanning {df['elapsed_min'].max():.1f} minutes")
     
     # Create visualizations
     print("Generating timeline visualization...")
     timeline_fig = create_memory_timeline(df)
     
     print("Analyzing per-test statistics...")
-    test_fig, test_stats = create_per_test_analysis(df)
+    test_fig, test_stats = create_per_test_analysis(df, test_stats)
     
     print("Creating summary...")
     summary_html = create_summary_table(df, test_stats)
@@ -362,15 +635,12 @@ def generate_report(memory_file, longhaul_file=None, output_file=None):
         timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
         output_file = f"memory-analysis-{timestamp}.html"
     
-    print(f"Writing report to: {output_file}")
-    
-    with open(output_file, 'w') as f:
-        f.write(f"""
+    html = f"""
 <!DOCTYPE html>
 <html>
 <head>
     <title>Zoned Memory Analysis Report</title>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    <script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>
 </head>
 <body>
     <div style="max-width: 1400px; margin: 0 auto;">
@@ -388,8 +658,8 @@ def generate_report(memory_file, longhaul_file=None, output_file=None):
         <div id="per-test"></div>
         
         <script>
-            {timeline_fig.to_html(include_plotlyjs=False, div_id="timeline")}
-            {test_fig.to_html(include_plotlyjs=False, div_id="per-test")}
+            Plotly.newPlot("timeline", {timeline_fig.to_json(validate=False)});
+            Plotly.newPlot("per-test", {test_fig.to_json(validate=False)});
         </script>
         
         <div style="margin-top: 50px; padding: 20px; background-color: #f9f9f9; font-family: Arial, sans-serif;">
@@ -412,10 +682,24 @@ def generate_report(memory_file, longhaul_file=None, output_file=None):
     </div>
 </body>
 </html>
-        """)
+        """
+    
+    # The embedded figure JSON is repetitive and compresses well (~4x)
+    if compress:
+        output_file += '.gz'
+        print(f"Writing compressed report to: {output_file}")
+        with gzip.open(output_file, 'wt', compresslevel=6) as f:
+            f.write(html)
+    else:
+        print(f"Writing report to: {output_file}")
+        with open(output_file, 'w') as f:
+            f.write(html)
     
     print(f"\n✓ Report generated successfully!")
-    print(f"  Open in browser: file://{Path(output_file).absolute()}")
+    if compress:
+        print(f"  Serve with Content-Encoding: gzip, or decompress first: gunzip -k {output_file}")
+    else:
+        print(f"  Open in browser: file://{Path(output_file).absolute()}")
     
     return output_file
 
@@ -425,6 +709,10 @@ def main():
     parser.add_argument('memory_csv', help='Path to memory-*.csv file')
     parser.add_argument('--longhaul', help='Path to longhaul-*.csv file (optional)')
     parser.add_argument('--output', '-o', help='Output HTML file (default: auto-generated)')
+    parser.add_argument('--chunksize', type=int,
+                        help='Read the CSV N rows at a time to bound memory on very long runs')
+    parser.add_argument('--gzip', action='store_true',
+                        help='Write a gzip-compressed report (<output>.gz)')
     
     args = parser.parse_args()
     
@@ -432,8 +720,12 @@ def main():
         print(f"Error: File not found: {args.memory_csv}")
         sys.exit(1)
     
+    if args.chunksize is not None and args.chunksize < 1:
+        print(f"Error: --chunksize must be a positive number of rows, got {args.chunksize}")
+        sys.exit(1)
+    
     try:
-        generate_report(args.memory_csv, args.longhaul, args.output)
+        generate_report(args.memory_csv, args.longhaul, args.output, args.chunksize, args.gzip)
     except Exception as e:
         print(f"Error generating report: {e}")
         import traceback
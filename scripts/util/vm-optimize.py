@@ -9,24 +9,16 @@ Usage:
     ./vm-optimize.py --vm "vm-name"     # Direct VM selection
 """
 
+from __future__ import annotations
+
 import sys
 import argparse
-import re
-from copy import deepcopy
 from typing import Optional
 from difflib import unified_diff
+from itertools import islice
 
-try:
-    import libvirt
-    HAS_LIBVIRT = True
-except ImportError:
-    HAS_LIBVIRT = False
-
-try:
-    from lxml import etree
-    HAS_LXML = True
-except ImportError:
-    HAS_LXML = False
+# Imported by check_dependencies() so --help doesn't pay for them
+libvirt = etree = XML_PARSER = None
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -68,13 +60,38 @@ OPTIMIZATIONS = {
     }
 }
 
+# Emulated device types that get replaced with VirtIO
+LEGACY_DISK_BUSES = frozenset({"ide", "sata", "scsi"})
+LEGACY_NIC_MODELS = frozenset({"rtl8139", "e1000", "e1000e"})
+LEGACY_VIDEO_MODELS = frozenset({"qxl", "vga", "cirrus"})
+
+# Child element tags looked up or created while optimizing
+TAG_TARGET = "target"
+TAG_DRIVER = "driver"
+TAG_MODEL = "model"
+TAG_ACCEL = "acceleration"
+TAG_GL = "gl"
+TAG_TOPOLOGY = "topology"
+TAG_CPU = "cpu"
+TAG_VCPU = "vcpu"
+
+# Diff line colors by first character: added, removed, hunk header
+DIFF_COLORS = {"+": "\033[32m", "-": "\033[31m", "@": "\033[36m"}
+ANSI_RESET = "\033[0m"
+
 
 def check_dependencies():
-    """Verify required dependencies are available."""
+    """Import libvirt/lxml into module globals, exiting if either is missing."""
+    global libvirt, etree, XML_PARSER
+    
     missing = []
-    if not HAS_LIBVIRT:
+    try:
+        import libvirt
+    except ImportError:
         missing.append("libvirt-python (dnf install python3-libvirt)")
-    if not HAS_LXML:
+    try:
+        from lxml import etree
+    except ImportError:
         missing.append("lxml (pip install lxml --break-system-packages)")
     
     if missing:
@@ -82,6 +99,11 @@ def check_dependencies():
         for dep in missing:
             print(f"  - {dep}", file=sys.stderr)
         sys.exit(1)
+    
+    # Shared parser. Dropping whitespace-only text nodes keeps the tree small
+    # and lets pretty_print re-indent edited elements cleanly.
+    XML_PARSER = etree.XMLParser(remove_blank_text=True, resolve_entities=False,
+                                 collect_ids=False)
 
 
 def connect_libvirt(uri: str) -> libvirt.virConnect:
@@ -99,11 +121,10 @@ def connect_libvirt(uri: str) -> libvirt.virConnect:
 
 def list_vms(conn: libvirt.virConnect) -> list[tuple[str, bool]]:
     """List all VMs with their running state."""
-    vms = []
-    for dom in conn.listAllDomains():
-        name = dom.name()
-        running = dom.isActive()
-        vms.append((name, running))
+    # Let libvirtd partition by state instead of one isActive() RPC per domain
+    active = conn.listAllDomains(libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE)
+    inactive = conn.listAllDomains(libvirt.VIR_CONNECT_LIST_DOMAINS_INACTIVE)
+    vms = [(dom.name(), True) for dom in active] + [(dom.name(), False) for dom in inactive]
     return sorted(vms, key=lambda x: x[0].lower())
 
 
@@ -136,168 +157,301 @@ def select_vm(vms: list[tuple[str, bool]]) -> Optional[str]:
             return None
 
 
-def get_vm_xml(conn: libvirt.virConnect, name: str) -> str:
-    """Get VM XML configuration."""
+def get_vm_xml(conn: libvirt.virConnect, name: str) -> tuple[libvirt.virDomain, bytes]:
+    """
+    Look up a VM and get its XML configuration as UTF-8 bytes, ready for lxml.
+    Returns the domain too so apply_changes doesn't need a second lookup.
+    """
     try:
         dom = conn.lookupByName(name)
-        return dom.XMLDesc(0)
+        return dom, dom.XMLDesc(0).encode('utf-8')
     except libvirt.libvirtError as e:
         print(f"Error getting VM config: {e}", file=sys.stderr)
         sys.exit(1)
 
 
-def optimize_xml(xml_str: str) -> tuple[str, list[tuple[str, str, str]]]:
-    """
-    Apply optimizations to VM XML.
-    Returns: (optimized_xml, list of (optimization_key, old_value, new_value))
-    """
-    root = etree.fromstring(xml_str.encode())
+def virtio_dev_name(dev: str) -> str:
+    """Map an IDE/SATA/SCSI device name to its VirtIO name (sda → vda)."""
+    if dev[:2] in ("hd", "sd"):
+        return "vd" + dev[2:]
+    return dev
+
+
+def optimize_disk(disk) -> list[tuple[str, str, str]]:
+    """Switch a disk to the VirtIO bus and tune its driver settings."""
     changes = []
+    if disk.get("device") != "disk":
+        return changes
+    
+    target = disk.find(TAG_TARGET)
+    driver = disk.find(TAG_DRIVER)
     
-    # ─── Disk optimization ───
-    for disk in root.xpath("//disk[@device='disk']"):
-        target = disk.find("target")
-        driver = disk.find("driver")
+    if target is not None:
+        old_bus = target.get("bus", "unknown")
+        if old_bus in LEGACY_DISK_BUSES:
+            # Change bus to virtio
+            target.set("bus", "virtio")
+            # Update device name (hda/sda → vda)
+            old_dev = target.get("dev", "")
+            new_dev = virtio_dev_name(old_dev)
+            if old_dev:
+                target.set("dev", new_dev)
+            changes.append(("disk_bus", f"{old_bus} ({old_dev})", f"virtio ({new_dev})"))
+    
+    # Optimize driver settings
+    if driver is not None:
+        attrib = driver.attrib
+        old_cache = attrib.get("cache", "default")
+        old_discard = attrib.get("discard", "none")
+        old_io = attrib.get("io", "default")
         
-        if target is not None:
-            old_bus = target.get("bus", "unknown")
-            if old_bus in ("ide", "sata", "scsi"):
-                # Change bus to virtio
-                target.set("bus", "virtio")
-                # Update device name (hda/sda → vda)
-                old_dev = target.get("dev", "")
-                if old_dev:
-                    new_dev = re.sub(r'^[hs]d', 'vd', old_dev)
-                    target.set("dev", new_dev)
-                changes.append(("disk_bus", f"{old_bus} ({old_dev})", f"virtio ({new_dev})"))
+        needs_change = (old_cache != "writeback" or 
+                      old_discard != "unmap" or 
+                      old_io != "threads")
         
-        # Optimize driver settings
-        if driver is not None:
-            old_cache = driver.get("cache", "default")
-            old_discard = driver.get("discard", "none")
-            old_io = driver.get("io", "default")
+        if needs_change:
+            attrib["cache"] = "writeback"
+            attrib["discard"] = "unmap"
+            attrib["io"] = "threads"
+            changes.append(("disk_cache", 
+                          f"cache={old_cache}, discard={old_discard}, io={old_io}",
+                          "cache=writeback, discard=unmap, io=threads"))
+    
+    return changes
+
+
+def optimize_interface(iface) -> list[tuple[str, str, str]]:
+    """Switch an emulated NIC model to VirtIO."""
+    changes = []
+    model = iface.find(TAG_MODEL)
+    if model is not None:
+        old_type = model.get("type", "unknown")
+        if old_type in LEGACY_NIC_MODELS:
+            model.set("type", "virtio")
+            changes.append(("nic_model", old_type, "virtio"))
+    return changes
+
+
+def optimize_video(video) -> list[tuple[str, str, str]]:
+    """Switch an emulated video model to VirtIO-GPU with 3D acceleration."""
+    changes = []
+    model = video.find(TAG_MODEL)
+    if model is not None:
+        old_type = model.get("type", "unknown")
+        if old_type in LEGACY_VIDEO_MODELS:
+            model.set("type", "virtio")
+            model.set("heads", "1")
+            model.set("primary", "yes")
             
-            needs_change = (old_cache != "writeback" or 
-                          old_discard != "unmap" or 
-                          old_io != "threads")
+            # Add/update acceleration
+            accel = model.find(TAG_ACCEL)
+            if accel is None:
+                accel = etree.SubElement(model, TAG_ACCEL)
+            old_accel = accel.get("accel3d", "no")
+            accel.set("accel3d", "yes")
             
-            if needs_change:
-                driver.set("cache", "writeback")
-                driver.set("discard", "unmap")
-                driver.set("io", "threads")
-                changes.append(("disk_cache", 
-                              f"cache={old_cache}, discard={old_discard}, io={old_io}",
-                              "cache=writeback, discard=unmap, io=threads"))
-    
-    # ─── NIC optimization ───
-    for iface in root.xpath("//interface"):
-        model = iface.find("model")
-        if model is not None:
-            old_type = model.get("type", "unknown")
-            if old_type in ("rtl8139", "e1000", "e1000e"):
-                model.set("type", "virtio")
-                changes.append(("nic_model", old_type, "virtio"))
-    
-    # ─── Video optimization ───
-    for video in root.xpath("//video"):
-        model = video.find("model")
-        if model is not None:
-            old_type = model.get("type", "unknown")
-            if old_type in ("qxl", "vga", "cirrus"):
-                model.set("type", "virtio")
-                model.set("heads", "1")
-                model.set("primary", "yes")
-                
-                # Add/update acceleration
-                accel = model.find("acceleration")
-                if accel is None:
-                    accel = etree.SubElement(model, "acceleration")
-                old_accel = accel.get("accel3d", "no")
-                accel.set("accel3d", "yes")
-                
-                changes.append(("video_model", old_type, "virtio"))
-                if old_accel != "yes":
-                    changes.append(("video_accel", f"accel3d={old_accel}", "accel3d=yes"))
-    
-    # ─── SPICE GL optimization ───
-    for graphics in root.xpath("//graphics[@type='spice']"):
-        gl = graphics.find("gl")
-        if gl is None:
-            gl = etree.SubElement(graphics, "gl")
-        
-        old_enable = gl.get("enable", "no")
-        if old_enable != "yes":
-            gl.set("enable", "yes")
-            if gl.get("rendernode") is None:
-                gl.set("rendernode", "/dev/dri/renderD128")
-            changes.append(("spice_gl", f"enable={old_enable}", "enable=yes"))
+            changes.append(("video_model", old_type, "virtio"))
+            if old_accel != "yes":
+                changes.append(("video_accel", f"accel3d={old_accel}", "accel3d=yes"))
+    return changes
+
+
+def optimize_graphics(graphics) -> list[tuple[str, str, str]]:
+    """Enable OpenGL on a SPICE display."""
+    changes = []
+    if graphics.get("type") != "spice":
+        return changes
+    
+    gl = graphics.find(TAG_GL)
+    if gl is None:
+        gl = etree.SubElement(graphics, TAG_GL)
+    
+    old_enable = gl.get("enable", "no")
+    if old_enable != "yes":
+        gl.set("enable", "yes")
+        if gl.get("rendernode") is None:
+            gl.set("rendernode", "/dev/dri/renderD128")
+        changes.append(("spice_gl", f"enable={old_enable}", "enable=yes"))
+    return changes
+
+
+# Device element tag → optimizer, in the order changes are reported
+DEVICE_OPTIMIZERS = {
+    "disk": optimize_disk,
+    "interface": optimize_interface,
+    "video": optimize_video,
+    "graphics": optimize_graphics,
+}
+
+
+def element_spans(xml_bytes: bytes, tag: bytes) -> Optional[list[bytes]]:
+    """
+    Raw text of every <tag ...> element, from its start tag to its end tag.
+    Returns None when elements overlap or are left open, so the caller can
+    give up instead of guessing.
+    """
+    spans = []
+    start = xml_bytes.find(b"<" + tag + b" ")
+    while start != -1:
+        open_end = xml_bytes.find(b">", start)
+        if open_end == -1:
+            return None
+        if xml_bytes[open_end - 1:open_end] == b"/":
+            end = open_end + 1
+        else:
+            end = xml_bytes.find(b"</" + tag + b">", open_end)
+            if end == -1:
+                return None
+        next_start = xml_bytes.find(b"<" + tag + b" ", start + 1)
+        if next_start != -1 and next_start < end:
+            return None
+        spans.append(xml_bytes[start:end])
+        start = next_start
+    return spans
+
+
+def start_tag(span: bytes, tag: bytes) -> Optional[bytes]:
+    """Raw text of the first <tag ...> start tag inside span, if any."""
+    start = span.find(b"<" + tag + b" ")
+    if start == -1:
+        return None
+    return span[start:span.find(b">", start) + 1]
+
+
+def has_attr(text: bytes, attr: str, value: str) -> bool:
+    """Whether text contains attr=value (libvirt quotes with ', lxml with ")."""
+    return (f"{attr}='{value}'".encode() in text or
+            f'{attr}="{value}"'.encode() in text)
+
+
+def looks_optimized(xml_bytes: bytes) -> bool:
+    """
+    Cheap pre-parse check for XML that optimize_xml would leave unchanged.
+
+    Works on the raw text, element by element: every <disk> must have a
+    tuned <driver>, every <graphics> GL enabled, and <cpu> must already be
+    host-passthrough with a <topology>. Both libvirt and lxml escape < and >
+    in text and attribute values, so tags found this way are real ones;
+    comments and CDATA could hide markup, so they bail out. Anything
+    uncertain returns False and gets the full parse.
+    """
+    if b"<!--" in xml_bytes or b"<![CDATA[" in xml_bytes:
+        return False
+    
+    # Legacy types anywhere (even on unrelated elements) force a full parse
+    if any(has_attr(xml_bytes, "bus", bus) for bus in LEGACY_DISK_BUSES):
+        return False
+    if any(has_attr(xml_bytes, "type", model) for model in LEGACY_NIC_MODELS | LEGACY_VIDEO_MODELS):
+        return False
+    
+    # Checks disks of every device type, so cdroms only make this stricter
+    disks = element_spans(xml_bytes, b"disk")
+    if disks is None:
+        return False
+    for disk in disks:
+        driver = start_tag(disk, b"driver")
+        if driver is None or not (has_attr(driver, "cache", "writeback") and
+                                  has_attr(driver, "discard", "unmap") and
+                                  has_attr(driver, "io", "threads")):
+            return False
+    
+    # Requires GL on every display, SPICE or not
+    displays = element_spans(xml_bytes, b"graphics")
+    if displays is None:
+        return False
+    for graphics in displays:
+        gl = start_tag(graphics, b"gl")
+        if gl is None or not has_attr(gl, "enable", "yes"):
+            return False
+    
+    cpus = element_spans(xml_bytes, b"cpu")
+    if cpus is None or len(cpus) != 1:
+        return False
+    cpu = cpus[0]
+    return has_attr(start_tag(cpu, b"cpu"), "mode", "host-passthrough") and b"<topology" in cpu
+
+
+def optimize_xml(xml_bytes: bytes) -> tuple[bytes, list[str], list[tuple[str, str, str]]]:
+    """
+    Apply optimizations to VM XML.
+    Returns: (optimized_xml, optimized_lines, list of (optimization_key, old_value, new_value))
+    where optimized_lines is the diff-ready form (see format_xml_for_diff).
+    """
+    if looks_optimized(xml_bytes):
+        return xml_bytes, [], []
+    
+    root = etree.fromstring(xml_bytes, XML_PARSER)
+    changes = []
+    
+    # ─── Device optimization (single pass over the tree) ───
+    device_changes = {tag: [] for tag in DEVICE_OPTIMIZERS}
+    for elem in root.iter(*DEVICE_OPTIMIZERS):
+        device_changes[elem.tag].extend(DEVICE_OPTIMIZERS[elem.tag](elem))
+    for tag_changes in device_changes.values():
+        changes.extend(tag_changes)
     
     # ─── CPU optimization ───
-    cpu = root.find("cpu")
-    if cpu is not None:
-        old_mode = cpu.get("mode", "custom")
-        if old_mode != "host-passthrough":
-            cpu.set("mode", "host-passthrough")
-            cpu.set("check", "none")
-            cpu.set("migratable", "on")
-            changes.append(("cpu_mode", old_mode, "host-passthrough"))
-        
-        # Add topology if missing
-        vcpu_elem = root.find("vcpu")
+    # Both are direct children of <domain>; pick them up in one pass
+    cpu = vcpu_elem = None
+    for child in root:
+        if child.tag == TAG_CPU:
+            cpu = child
+        elif child.tag == TAG_VCPU:
+            vcpu_elem = child
+        if cpu is not None and vcpu_elem is not None:
+            break
+    
+    # Create CPU element if missing, right after <vcpu>
+    cpu_was_missing = cpu is None
+    if cpu_was_missing:
+        cpu = etree.Element(TAG_CPU)
         if vcpu_elem is not None:
-            vcpu_count = int(vcpu_elem.text or "1")
-            topology = cpu.find("topology")
-            if topology is None:
-                topology = etree.SubElement(cpu, "topology")
-                topology.set("sockets", "1")
-                topology.set("dies", "1")
-                topology.set("clusters", "1")
-                topology.set("cores", str(vcpu_count))
-                topology.set("threads", "1")
-                changes.append(("cpu_topology", "none", f"1 socket × {vcpu_count} cores × 1 thread"))
-    else:
-        # Create CPU element if missing
-        vcpu_elem = root.find("vcpu")
-        vcpu_count = int(vcpu_elem.text) if vcpu_elem is not None else 1
-        
-        cpu = etree.Element("cpu", mode="host-passthrough", check="none", migratable="on")
-        topology = etree.SubElement(cpu, "topology")
+            vcpu_elem.addnext(cpu)
+        else:
+            root.append(cpu)
+    
+    old_mode = "default" if cpu_was_missing else cpu.get("mode", "custom")
+    if old_mode != "host-passthrough":
+        cpu.set("mode", "host-passthrough")
+        cpu.set("check", "none")
+        cpu.set("migratable", "on")
+        changes.append(("cpu_mode", old_mode, "host-passthrough"))
+    
+    # Add topology if missing (always for a new <cpu>, even without <vcpu>)
+    if (vcpu_elem is not None or cpu_was_missing) and cpu.find(TAG_TOPOLOGY) is None:
+        vcpu_count = int(vcpu_elem.text or "1") if vcpu_elem is not None else 1
+        topology = etree.SubElement(cpu, TAG_TOPOLOGY)
         topology.set("sockets", "1")
         topology.set("dies", "1")
         topology.set("clusters", "1")
         topology.set("cores", str(vcpu_count))
         topology.set("threads", "1")
-        
-        # Insert after <vcpu> element
-        if vcpu_elem is not None:
-            vcpu_elem.addnext(cpu)
-        else:
-            root.append(cpu)
-        
-        changes.append(("cpu_mode", "default", "host-passthrough"))
         changes.append(("cpu_topology", "none", f"1 socket × {vcpu_count} cores × 1 thread"))
     
     # Generate optimized XML
-    optimized = etree.tostring(root, encoding='unicode', pretty_print=True)
+    # Serialize straight to UTF-8 bytes with the declaration included
+    optimized = etree.tostring(root, encoding='UTF-8', pretty_print=True,
+                               xml_declaration=True)
     
-    # Ensure XML declaration
-    if not optimized.startswith('<?xml'):
-        optimized = '<?xml version="1.0" encoding="UTF-8"?>\n' + optimized
+    # Already in format_xml_for_diff's form (minus the declaration line),
+    # so the diff can reuse it as-is
+    optimized_lines = optimized.decode('utf-8').splitlines(keepends=True)[1:]
     
-    return optimized, changes
+    return optimized, optimized_lines, changes
 
 
-def format_xml_for_diff(xml_str: str) -> list[str]:
+def format_xml_for_diff(xml_bytes: bytes) -> list[str]:
     """Parse and re-format XML for consistent diffing."""
     try:
-        root = etree.fromstring(xml_str.encode())
+        root = etree.fromstring(xml_bytes, XML_PARSER)
         formatted = etree.tostring(root, encoding='unicode', pretty_print=True)
         return formatted.splitlines(keepends=True)
     except Exception:
-        return xml_str.splitlines(keepends=True)
+        return xml_bytes.decode('utf-8', errors='replace').splitlines(keepends=True)
 
 
-def show_changes(changes: list[tuple[str, str, str]], original_xml: str, optimized_xml: str):
+def show_changes(changes: list[tuple[str, str, str]], original_xml: bytes,
+                 optimized_lines: list[str]):
     """Display proposed changes."""
     if not changes:
         print("\n✓ VM is already optimized. No changes needed.")
@@ -321,42 +475,43 @@ def show_changes(changes: list[tuple[str, str, str]], original_xml: str, optimiz
     
     # Show unified diff
     orig_lines = format_xml_for_diff(original_xml)
-    opt_lines = format_xml_for_diff(optimized_xml)
-    
-    diff = list(unified_diff(orig_lines, opt_lines, 
-                            fromfile='original', tofile='optimized',
-                            lineterm=''))
-    
-    # Show first 50 lines of diff
-    diff_display = diff[:50]
-    for line in diff_display:
-        if line.startswith('+') and not line.startswith('+++'):
-            print(f"\033[32m{line}\033[0m")  # Green
-        elif line.startswith('-') and not line.startswith('---'):
-            print(f"\033[31m{line}\033[0m")  # Red
-        elif line.startswith('@@'):
-            print(f"\033[36m{line}\033[0m")  # Cyan
+    
+    diff = unified_diff(orig_lines, optimized_lines,
+                        fromfile='original', tofile='optimized',
+                        lineterm='')
+    
+    # Show first 50 lines of diff (consumed lazily, never held in a list).
+    # Content lines keep their own newline, header lines have none.
+    use_color = sys.stdout.isatty()
+    out = []
+    for line in islice(diff, 50):
+        line = line.rstrip('\n')
+        color = DIFF_COLORS.get(line[:1]) if use_color else None
+        if color is None or line.startswith(('+++', '---')):
+            out.append(line + '\n')
         else:
-            print(line)
+            out.append(color + line + ANSI_RESET + '\n')
+    sys.stdout.write(''.join(out))
     
-    if len(diff) > 50:
-        print(f"\n... ({len(diff) - 50} more lines)")
+    remaining = sum(1 for _ in diff)
+    if remaining:
+        print(f"\n... ({remaining} more lines)")
     
     print("-" * 60)
     return True
 
 
-def apply_changes(conn: libvirt.virConnect, vm_name: str, optimized_xml: str) -> bool:
+def apply_changes(conn: libvirt.virConnect, dom: libvirt.virDomain, optimized_xml: bytes) -> bool:
     """Apply optimized config to VM."""
     try:
-        dom = conn.lookupByName(vm_name)
+        vm_name = dom.name()
         is_running = dom.isActive()
         
         if is_running:
             print("\n⚠️  VM is running. Changes will apply on next boot.")
         
-        # Define (update) the VM with new XML
-        conn.defineXML(optimized_xml)
+        # Define (update) the VM with new XML; the binding only takes str
+        conn.defineXML(optimized_xml.decode('utf-8'))
         print(f"\n✓ Configuration updated for '{vm_name}'")
         
         if is_running:
@@ -409,11 +564,11 @@ Examples:
     print(f"\nAnalyzing '{vm_name}'...")
     
     # Get and optimize
-    original_xml = get_vm_xml(conn, vm_name)
-    optimized_xml, changes = optimize_xml(original_xml)
+    dom, original_xml = get_vm_xml(conn, vm_name)
+    optimized_xml, optimized_lines, changes = optimize_xml(original_xml)
     
     # Show changes
-    has_changes = show_changes(changes, original_xml, optimized_xml)
+    has_changes = show_changes(changes, original_xml, optimized_lines)
     
     if not has_changes:
         conn.close()
@@ -437,7 +592,7 @@ Examples:
             conn.close()
             return 0
     
-    success = apply_changes(conn, vm_name, optimized_xml)
+    success = apply_changes(conn, dom, optimized_xml)
     conn.close()
     
     return 0 if success else 1